@@ -12,3 +12,4 @@ from . import call
 from . import constants
 from . import cigarcall
 from . import pipeline
+from . import kmer
@@ -1051,13 +1051,11 @@ class AlignLift:
         if len(set(df.index)) != df.shape[0]:
             raise RuntimeError('Cannot create AlignLift object with duplicate index values')
 
-        # Build a reference-coordinate and a tig-coordinate tree
-        self.ref_tree = collections.defaultdict(intervaltree.IntervalTree)
-        self.tig_tree = collections.defaultdict(intervaltree.IntervalTree)
+        # Build reference-coordinate and tig-coordinate lookups (sorted arrays searched with np.searchsorted())
+        self.tree_index = list(df.index)  # Tree labels are integers, translate back to the DataFrame index
 
-        for index, row in df.iterrows():
-            self.ref_tree[row['#CHROM']][row['POS']:row['END']] = index
-            self.tig_tree[row['QUERY_ID']][row['QUERY_TIG_POS']:row['QUERY_TIG_END']] = index
+        self.ref_tree = _sorted_interval_tree(df['#CHROM'], df['POS'], df['END'])
+        self.tig_tree = _sorted_interval_tree(df['QUERY_ID'], df['QUERY_TIG_POS'], df['QUERY_TIG_END'])
 
         # Build alignment caching structures
         self.cache_queue = collections.deque()
@@ -1103,12 +1101,12 @@ class AlignLift:
             pos_org = pos  # Pre-reverse position
 
             # Find matching records
-            match_set = self.tig_tree[query_id][pos:(pos + 1)]
+            match_list = self._tig_overlap(query_id, pos)
 
-            if len(match_set) == 1:
-                index = list(match_set)[0].data
+            if len(match_list) == 1:
+                index = match_list[0]
 
-            elif len(match_set) == 0 and gap:
+            elif len(match_list) == 0 and gap:
                 lift_coord_list.append(self._get_subject_gap(query_id, pos))
                 continue
 
@@ -1222,25 +1220,25 @@ class AlignLift:
         lift_coord_list = list()
 
         for pos in coord:
-            match_set = self.ref_tree[subject_id][pos:(pos + 1)]
+            match_list = self._ref_overlap(subject_id, pos)
 
             # Check coordinates
-            if len(match_set) == 0:
+            if len(match_list) == 0:
                 lift_coord_list.append(None)
                 continue
 
                 # raise ValueError('Subject region {}:{} has no to-query lift records'.format(subject_id, pos))
 
-            if len(match_set) > 1:
+            if len(match_list) > 1:
                 lift_coord_list.append(None)
                 continue
 
                 # raise ValueError(
-                #     'Subject region {}:{} has {} to-query lift records'.format(subject_id, pos, len(match_set))
+                #     'Subject region {}:{} has {} to-query lift records'.format(subject_id, pos, len(match_list))
                 # )
 
             # Get lift tree
-            index = list(match_set)[0].data
+            index = match_list[0]
 
             if index not in self.ref_cache.keys():
                 self._add_align(index)
@@ -1347,6 +1345,30 @@ class AlignLift:
             end_aln_index=(query_end[5],)
         )
 
+    def _ref_overlap(self, subject_id, pos):
+        """
+        Get alignment records overlapping a reference position.
+
+        :param subject_id: Subject ID.
+        :param pos: Subject position.
+
+        :return: List of DataFrame indices for alignment records covering `pos`.
+        """
+
+        return [self.tree_index[label] for label in _sorted_interval_overlap(self.ref_tree, subject_id, pos)]
+
+    def _tig_overlap(self, query_id, pos):
+        """
+        Get alignment records overlapping a contig position.
+
+        :param query_id: Query ID.
+        :param pos: Query position (contig coordinates, QUERY_TIG_POS-space).
+
+        :return: List of DataFrame indices for alignment records covering `pos`.
+        """
+
+        return [self.tree_index[label] for label in _sorted_interval_overlap(self.tig_tree, query_id, pos)]
+
     def _get_subject_gap(self, query_id, pos):
         """
         Interpolate lift coordinates to an alignment gap.
@@ -1498,6 +1520,62 @@ class AlignLift:
             del(self.tig_cache[index])
 
 
+def _sorted_interval_tree(chrom_arr, pos_arr, end_arr):
+    """
+    Build sorted interval arrays for `_sorted_interval_overlap()`.
+
+    :param chrom_arr: Interval chromosome or sequence names.
+    :param pos_arr: Interval start positions.
+    :param end_arr: Interval end positions.
+
+    :return: A dict keyed by chromosome where each value is a tuple of arrays for intervals on that chromosome sorted
+        by start position: start positions, end positions, the running maximum of end positions, and the position of
+        each interval in the input (label).
+    """
+
+    df_tree = pd.DataFrame({
+        'CHROM': np.asarray(chrom_arr),
+        'POS': np.asarray(pos_arr, dtype=np.int64),
+        'END': np.asarray(end_arr, dtype=np.int64),
+        'LABEL': np.arange(len(chrom_arr))
+    }).sort_values(['CHROM', 'POS'], kind='stable')
+
+    tree = dict()
+
+    for chrom, df_chrom in df_tree.groupby('CHROM', sort=False):
+        end = df_chrom['END'].values
+
+        tree[chrom] = (df_chrom['POS'].values, end, np.maximum.accumulate(end), df_chrom['LABEL'].values)
+
+    return tree
+
+
+def _sorted_interval_overlap(tree, chrom, pos):
+    """
+    Find intervals covering a position in sorted interval arrays.
+
+    :param tree: Sorted interval arrays (`_sorted_interval_tree()`).
+    :param chrom: Chromosome or sequence name.
+    :param pos: Position.
+
+    :return: A list of labels for intervals covering `pos`.
+    """
+
+    if chrom not in tree:
+        return []
+
+    start, end, end_max, label = tree[chrom]
+
+    # Intervals before lo end at or before pos, intervals at or after hi start after pos
+    lo = np.searchsorted(end_max, pos, side='right')
+    hi = np.searchsorted(start, pos, side='right')
+
+    if lo >= hi:
+        return []
+
+    return label[lo:hi][end[lo:hi] > pos].tolist()
+
+
 def check_record(row, df_tig_fai):
     """
     Check alignment DatFrame record for sanity. Throws exceptions if there are problems. Returns nothing if everything
@@ -8,6 +8,8 @@ import pandas as pd
 
 import scipy.stats
 
+import pavlib
+
 # K-mer orientation matrix: Tig k-mer against forward (vertical axis)
 # and reverse (horizontal axis) k-mers in the reference
 #
@@ -28,7 +30,7 @@ SAMPLE_INDEX_CHUNK_SIZE = 400
 
 def get_smoothed_density(
         tig_mer_stream,
-        ref_kmer_set,
+        ref_kmer_arr,
         k_util,
         threads=1,
         min_informative_kmers=2000,
@@ -40,7 +42,7 @@ def get_smoothed_density(
 
     """
     Transform a k-mer stream from a section of a contig (tig_mer_stream) and a set of reference k-mers it aligns to
-    (ref_kmer_set) and generate a smoothed density plot showing forward, reverse, and forward-reverse (reference has
+    (ref_kmer_arr) and generate a smoothed density plot showing forward, reverse, and forward-reverse (reference has
     both the forward and reverse complement) k-mers. These smoothed states can then be used to call inversion
     boundaries.
 
@@ -65,7 +67,8 @@ def get_smoothed_density(
     * KERN_REV: Kernel density of reverse-oriented k-mers.
 
     :param tig_mer_stream: A list of (k-mer, count) tuples from the contig region.
-    :param ref_kmer_set: A set of k-mers in the reference region where the contig region aligns.
+    :param ref_kmer_arr: A sorted numpy array (np.uint64) of k-mers in the reference region where the contig region
+        aligns.
     :param k_util: K-mer utility from kanapy package.
     :param threads: Number of threads to use for computing densities.
     :param min_informative_kmers: Do not attempt density if the number of informative k-mers does not reach this limit.
@@ -94,12 +97,12 @@ def get_smoothed_density(
     df['STATE'] = -1
 
     # Assign state
-    df['STATE_MER'] = df['KMER'].apply(lambda kmer:
-       KMER_ORIENTATION_STATE[
-           int(kmer in ref_kmer_set),
-           int(k_util.rev_complement(kmer) in ref_kmer_set)
-       ]
-    )
+    kmer_arr = df['KMER'].values.astype(np.uint64)
+
+    df['STATE_MER'] = KMER_ORIENTATION_STATE[
+        pavlib.kmer.in_sorted(ref_kmer_arr, kmer_arr).astype(int),
+        pavlib.kmer.in_sorted(ref_kmer_arr, pavlib.kmer.rev_complement_arr(kmer_arr, k_util.k_size)).astype(int)
+    ].astype(np.int8)
 
     # Subset to informative sites
     df = df.loc[df['STATE_MER'] != -1]
@@ -316,7 +319,7 @@ def get_smoothed_density(
     df['STATE'] = df[['KERN_FWD', 'KERN_FWDREV', 'KERN_REV']].apply(
         lambda vals: np.argmax(vals.array),
         axis=1
-    )
+    ).astype(np.int8)
 
     # Column order
     df = df[['INDEX', 'STATE_MER', 'STATE', 'KERN_FWD', 'KERN_FWDREV', 'KERN_REV', 'KMER']]
@@ -3,14 +3,20 @@ Routines for calling inversions.
 """
 
 import codecs
+import concurrent.futures
 import intervaltree
+import io
 import numpy as np
 import os
+import pandas as pd
 import pickle
+import pysam
 import subprocess
+import traceback
 
 import pavlib
 import svpoplib
+import kanapy
 
 #
 # Constants
@@ -39,6 +45,9 @@ DEFAULT_STATE_RUN_SMOOTH = 20  # Default value for --staterunsmooth parameter to
 
 CALL_SOURCE = 'FLAG-DEN'
 
+FLANK_CATEGORIES = ['UP', 'DN']
+MATCH_CATEGORIES = ['SAME', 'OTHER']
+
 # Matrix converting k-mer location to UP/DN match. Assign
 # NA to missing or k-mers in both.
 #
@@ -50,6 +59,22 @@ KMER_LOC_STATE = np.asarray(
     ]
 )
 
+# KMER_LOC_STATE as codes of MATCH_CATEGORIES (-1 = NA)
+KMER_LOC_CODE = np.asarray(
+    [
+        [MATCH_CATEGORIES.index(state) if state in MATCH_CATEGORIES else -1 for state in state_row]
+        for state_row in KMER_LOC_STATE
+    ],
+    dtype=np.int8
+)
+
+
+#
+# Objects used by scan_for_inv_batch() worker processes
+#
+
+_scan_worker_args = None
+
 
 class InvCall:
     """
@@ -149,7 +174,7 @@ def get_inv_from_record(row, df_density):
 def scan_for_inv(
         region_flag, ref_fa_name, tig_fa_name, align_lift, k_util, n_tree=None,
         max_region_size=None, threads=1, log=None, srs_tree=None,
-        min_exp_count=DEFAULT_MIN_EXP_COUNT
+        min_exp_count=DEFAULT_MIN_EXP_COUNT, df_fai=None
     ):
     """
     Scan region for inversions. Start with a flagged region (`region`) where variants indicated that an inversion
@@ -180,6 +205,8 @@ def scan_for_inv(
     :param min_exp_count: The number of region expansions to try (including the initial expansion) and finding only
         forward-oriented k-mer states after smoothing before giving up on the region. `None` sets the default value,
         `DEFAULT_MIN_EXP_COUNT`.
+    :param df_fai: Reference FAI (`svpoplib.ref.get_df_fai()`) for `ref_fa_name`. Callers scanning many regions should
+        read it once and pass it in. If `None`, it is read from `ref_fa_name` + ".fai".
 
     :return: A `InvCall` object describing the inversion found or `None` if no inversion was found.
     """
@@ -198,10 +225,14 @@ def scan_for_inv(
         log
     )
 
-    df_fai = svpoplib.ref.get_df_fai(ref_fa_name + '.fai')
+    if df_fai is None:
+        df_fai = svpoplib.ref.get_df_fai(ref_fa_name + '.fai')
 
     region_ref = region_flag.copy()
-    region_ref.expand(INITIAL_EXPAND, min_pos=0, max_end=df_fai, shift=True)
+
+    max_end = int(df_fai[region_ref.chrom]) if region_ref.chrom in df_fai.index else None  # Chromosome length
+
+    region_ref.expand(INITIAL_EXPAND, min_pos=0, max_end=max_end, shift=True)
 
     expansion_count = 0
 
@@ -289,11 +320,10 @@ def scan_for_inv(
         if df.shape[0] > 0:
             ## Check inversion ##
 
-            # Get run-length encoded states (list of (state, count) tuples).
-            state_rl = [record for record in pavlib.density.rl_encoder(df)]
-            condensed_states = [record[0] for record in state_rl]  # States only
+            # Get run-length encoded states (state, length, and first row of each run).
+            rl_val, rl_start, rl_len = _rle_states(df['STATE'].values)
 
-            if len(state_rl) == 1 and state_rl[0][0] in {0, -1} and expansion_count >= min_exp_count:
+            if len(rl_val) == 1 and rl_val[0] in {0, -1} and expansion_count >= min_exp_count:
                 _write_log(
                     'Found no inverted k-mer states after {} expansion(s)'.format(expansion_count),
                     log
@@ -302,33 +332,33 @@ def scan_for_inv(
                 return None
 
             # Done if reference oriented k-mers (state == 0) found an both sides
-            if len(condensed_states) > 2 and condensed_states[0] == 0 and condensed_states[-1] == 0:
+            if len(rl_val) > 2 and rl_val[0] == 0 and rl_val[-1] == 0:
                 break
 
             # Expand
             last_len = len(region_ref)
-            expand_bp = np.int32(len(region_ref) * EXPAND_FACTOR)
+            expand_bp = int(len(region_ref) * EXPAND_FACTOR)
 
-            if len(condensed_states) > 2:
+            if len(rl_val) > 2:
                 # More than one state. Expand disproportionately if reference was found up or downstream.
 
-                if condensed_states[0] == 0:
+                if rl_val[0] == 0:
                     region_ref.expand(
-                        expand_bp, min_pos=0, max_end=df_fai, shift=True, balance=0.25
+                        expand_bp, min_pos=0, max_end=max_end, shift=True, balance=0.25
                     )  # Ref upstream: +25% upstream, +75% downstream
 
-                elif condensed_states[-1] == 0:
+                elif rl_val[-1] == 0:
                     region_ref.expand(
-                        expand_bp, min_pos=0, max_end=df_fai, shift=True, balance=0.75
+                        expand_bp, min_pos=0, max_end=max_end, shift=True, balance=0.75
                     )  # Ref downstream: +75% upstream, +25% downstream
 
                 else:
                     region_ref.expand(
-                        expand_bp, min_pos=0, max_end=df_fai, shift=True, balance=0.5
+                        expand_bp, min_pos=0, max_end=max_end, shift=True, balance=0.5
                     )  # +50% upstream, +50% downstream
 
             else:
-                region_ref.expand(expand_bp, min_pos=0, max_end=df_fai, shift=True, balance=0.5)  # +50% upstream, +50% downstream
+                region_ref.expand(expand_bp, min_pos=0, max_end=max_end, shift=True, balance=0.5)  # +50% upstream, +50% downstream
 
             if len(region_ref) == last_len:
                 # Stop if expansion had no effect
@@ -350,14 +380,21 @@ def scan_for_inv(
             return None
 
     ## Characterize found region ##
+
+    # First and last k-mer index of each state run
+    index_arr = df['INDEX'].values
+
+    rl_pos = index_arr[rl_start]
+    rl_end = index_arr[rl_start + rl_len - 1]
+
     # Stop if no inverted sequence was found
-    if not np.any([record[0] == 2 for record in state_rl]):
+    inv_mask = rl_val == 2
+
+    if not inv_mask.any():
         _write_log('No inverted states found', log)
         return None
 
-    state_rl_inv = [val for val in state_rl if val[0] == 2]
-
-    max_inv_run = np.max([record[1] for record in state_rl if record[0] == 2])
+    max_inv_run = rl_len[inv_mask].max()
 
     if max_inv_run < MIN_INV_KMER_RUN:
         _write_log('Longest run of strictly inverted k-mers ({}) does not meet the minimum threshold ({})'.format(
@@ -367,24 +404,24 @@ def scan_for_inv(
         return None
 
     # Code check - must be flanked by reference sequence
-    if state_rl[0][0] != 0 or state_rl[-1][0] != 0:
+    if rl_val[0] != 0 or rl_val[-1] != 0:
         raise RuntimeError('Found INV region not flanked by reference sequence (program bug): {}'.format(region_ref))
 
-    # Subset to strictly inverted states (for calling inner breakpoints)
-    state_rl_inv = [record for record in state_rl if record[0] == 2]
+    # First and last strictly inverted states (for calling inner breakpoints)
+    inv_index = np.flatnonzero(inv_mask)
 
     # Find inverted repeat on left flank (upstream)
     region_tig_outer = pavlib.seq.Region(
         region_tig.chrom,
-        state_rl[1][2] + region_tig.pos,
-        state_rl[-2][3] + region_tig.pos + k_util.k_size,
+        rl_pos[1] + region_tig.pos,
+        rl_end[-2] + region_tig.pos + k_util.k_size,
         is_rev=region_tig.is_rev
     )
 
     region_tig_inner = pavlib.seq.Region(
         region_tig.chrom,
-        state_rl_inv[0][2] + region_tig.pos,
-        state_rl_inv[-1][3] + region_tig.pos + k_util.k_size,
+        rl_pos[inv_index[0]] + region_tig.pos,
+        rl_end[inv_index[-1]] + region_tig.pos + k_util.k_size,
         is_rev=region_tig.is_rev
     )
 
@@ -453,6 +490,141 @@ def scan_for_inv(
     return inv_call
 
 
+def scan_for_inv_batch(
+        region_flag_list, ref_fa_name, tig_fa_name, bed_aln_name, tig_fai_name, k_size, threads=1,
+        n_tree=None, max_region_size=None, srs_tree=None, min_exp_count=DEFAULT_MIN_EXP_COUNT, log=None
+    ):
+    """
+    Scan a list of flagged regions for inversions (see `scan_for_inv()`). Flagged regions are independent and are
+    distributed over `threads` worker processes. Each worker builds its own alignment lift-over tool from the alignment
+    BED, reads the reference FAI once, and scans one region at a time (density for each region is computed with one thread).
+
+    :param region_flag_list: List of flagged regions (`pavlib.seq.Region`).
+    :param ref_fa_name: Reference FASTA. Must also have a .fai file.
+    :param tig_fa_name: Contig FASTA. Must also have a .fai file.
+    :param bed_aln_name: Alignment BED file used to build `pavlib.align.AlignLift` in each worker.
+    :param tig_fai_name: Contig FAI file used to build `pavlib.align.AlignLift` in each worker.
+    :param k_size: K-mer size.
+    :param threads: Number of worker processes.
+    :param n_tree: See `scan_for_inv()`.
+    :param max_region_size: See `scan_for_inv()`.
+    :param srs_tree: See `scan_for_inv()`.
+    :param min_exp_count: See `scan_for_inv()`.
+    :param log: Log file (open file handle). Log messages for each region are written before the region is yielded.
+        If `scan_for_inv()` fails with an exception other than `RuntimeError`, the traceback is written to the log and
+        the exception is re-raised.
+
+    :return: An iterator of (region_flag, inv_call) tuples in the same order as `region_flag_list`. `inv_call` is
+        `None` if no inversion was found or if `scan_for_inv()` raised a `RuntimeError`.
+    """
+
+    init_args = (
+        ref_fa_name, tig_fa_name, bed_aln_name, tig_fai_name, k_size,
+        n_tree, max_region_size, srs_tree, min_exp_count
+    )
+
+    if threads <= 1:
+        scan_args = _get_scan_worker_args(*init_args)
+
+        result_iter = (_scan_worker(region_flag, scan_args) for region_flag in region_flag_list)
+
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=threads, initializer=_init_scan_worker, initargs=init_args
+        )
+
+        result_iter = executor.map(
+            _scan_worker, region_flag_list, chunksize=max(1, len(region_flag_list) // (threads * 4))
+        )
+
+    try:
+        for region_flag, inv_call, log_message, ex in result_iter:
+
+            if log is not None:
+                log.write(log_message)
+                log.flush()
+
+            if ex is not None:
+                raise ex
+
+            yield region_flag, inv_call
+
+    finally:
+        if threads > 1:
+            executor.shutdown(cancel_futures=True)
+
+
+def _init_scan_worker(*init_args):
+    """
+    Initialize a `scan_for_inv_batch()` worker process.
+
+    :param init_args: Arguments for `_get_scan_worker_args()`.
+    """
+
+    global _scan_worker_args
+
+    _scan_worker_args = _get_scan_worker_args(*init_args)
+
+
+def _get_scan_worker_args(
+        ref_fa_name, tig_fa_name, bed_aln_name, tig_fai_name, k_size,
+        n_tree, max_region_size, srs_tree, min_exp_count
+    ):
+    """
+    Get `scan_for_inv()` arguments shared by all regions in a `scan_for_inv_batch()` worker. See
+    `scan_for_inv_batch()` for parameters.
+
+    :return: A dict of keyword arguments for `scan_for_inv()`.
+    """
+
+    return {
+        'ref_fa_name': ref_fa_name,
+        'tig_fa_name': tig_fa_name,
+        'align_lift': pavlib.align.AlignLift(
+            pd.read_csv(bed_aln_name, sep='\t'),
+            svpoplib.ref.get_df_fai(tig_fai_name)
+        ),
+        'k_util': kanapy.util.kmer.KmerUtil(k_size),
+        'df_fai': svpoplib.ref.get_df_fai(ref_fa_name + '.fai'),
+        'n_tree': n_tree,
+        'max_region_size': max_region_size,
+        'srs_tree': srs_tree,
+        'min_exp_count': min_exp_count
+    }
+
+
+def _scan_worker(region_flag, scan_args=None):
+    """
+    Scan one flagged region in a `scan_for_inv_batch()` worker.
+
+    :param region_flag: Flagged region.
+    :param scan_args: Arguments from `_get_scan_worker_args()` or `None` to use the arguments set by
+        `_init_scan_worker()` in this process.
+
+    :return: A tuple of (region_flag, inv_call, log message, exception). `exception` is `None` unless
+        `scan_for_inv()` failed with an exception other than `RuntimeError`, which the caller should re-raise after
+        writing the log message (the traceback is written to the log message).
+    """
+
+    log = io.StringIO()
+    inv_call = None
+    scan_ex = None
+
+    try:
+        inv_call = scan_for_inv(
+            region_flag, threads=1, log=log, **(scan_args if scan_args is not None else _scan_worker_args)
+        )
+
+    except RuntimeError as ex:
+        log.write('RuntimeError in scan_for_inv(): {}\n'.format(ex))
+
+    except Exception as ex:
+        log.write('Error in scan_for_inv() for region {}:\n{}'.format(region_flag, traceback.format_exc()))
+        scan_ex = ex
+
+    return region_flag, inv_call, log.getvalue(), scan_ex
+
+
 def annotate_inv_dup_mers(
         df,
         region_ref_outer, region_ref_inner,
@@ -502,64 +674,87 @@ def annotate_inv_dup_mers(
         region_tig_outer.end
     )
 
-    # Get reference k-mer sets (canonical k-mers)
-    ref_set_up = {
-        k_util.canonical_complement(kmer) for kmer in pavlib.seq.ref_kmers(region_dup_ref_up, ref_fa, k_util).keys()
-    }
+    # Get reference k-mer sets (canonical k-mers) as sorted arrays (one open reference for both flanks)
+    with pysam.FastaFile(ref_fa) as ref_fa_file:
+        ref_arr_up = np.unique(pavlib.kmer.canonical_complement_arr(
+            pavlib.seq.ref_kmer_arrays(region_dup_ref_up, ref_fa_file, k_util)[0], k_util.k_size
+        ))
 
-    ref_set_dn = {
-        k_util.canonical_complement(kmer) for kmer in pavlib.seq.ref_kmers(region_dup_ref_dn, ref_fa, k_util).keys()
-    }
+        ref_arr_dn = np.unique(pavlib.kmer.canonical_complement_arr(
+            pavlib.seq.ref_kmer_arrays(region_dup_ref_dn, ref_fa_file, k_util)[0], k_util.k_size
+        ))
 
-    # Set canonical k-mers in df
-    df['KMER_CAN'] = df['KMER'].apply(lambda kmer: k_util.canonical_complement(kmer))
+    # Merge flank k-mers into one sorted array tagged with the flanks each k-mer is in (bit 0 = up, bit 1 = down)
+    ref_arr = np.union1d(ref_arr_up, ref_arr_dn)
 
-    # Add contig index
-    df['TIG_INDEX'] = df['INDEX'] + region_tig_discovery.pos
+    ref_tag = np.zeros(ref_arr.shape[0], dtype=np.uint8)
+    ref_tag[np.searchsorted(ref_arr, ref_arr_up)] |= 1
+    ref_tag[np.searchsorted(ref_arr, ref_arr_dn)] |= 2
 
-    # Annotate upstream and downstream inverted duplications
-    df['FLANK'] = np.nan
+    # Get canonical k-mers in df and test membership in both flanks with one search
+    kmer_can = pavlib.kmer.canonical_complement_arr(df['KMER'].values, k_util.k_size)
 
-    df.loc[
-        (df['TIG_INDEX'] >= region_dup_tig_up.pos) & (df['TIG_INDEX'] < region_dup_tig_up.end - k_util.k_size),
-        'FLANK'
-    ] = 'UP'
+    kmer_tag = np.zeros(kmer_can.shape[0], dtype=np.uint8)
 
-    df.loc[
-        (df['TIG_INDEX'] >= region_dup_tig_dn.pos) & (df['TIG_INDEX'] < region_dup_tig_dn.end - k_util.k_size),
-        'FLANK'
-    ] = 'DN'
+    if ref_arr.shape[0] > 0:
+        hit_index = np.minimum(np.searchsorted(ref_arr, kmer_can), ref_arr.shape[0] - 1)
+        hit_mask = ref_arr[hit_index] == kmer_can
 
-    # Annotate upstream/downstream k-mer matches
-    df['MATCH'] = np.nan
+        kmer_tag[hit_mask] = ref_tag[hit_index[hit_mask]]
 
-    df.loc[df['FLANK'] == 'UP', 'MATCH'] = df.loc[
-        df['FLANK'] == 'UP', 'KMER'
-    ].apply(lambda kmer:
-        KMER_LOC_STATE[
-            int(kmer in ref_set_up),
-            int(kmer in ref_set_dn)
-        ]
-    )
+    in_up = kmer_tag & 1
+    in_dn = kmer_tag >> 1
 
-    df.loc[df['FLANK'] == 'DN', 'MATCH'] = df.loc[
-        df['FLANK'] == 'DN', 'KMER'
-    ].apply(lambda kmer:
-        KMER_LOC_STATE[
-            int(kmer in ref_set_dn),
-            int(kmer in ref_set_up)
-        ]
-    )
+    # Annotate upstream and downstream inverted duplications (FLANK_CATEGORIES codes, -1 for neither). Flank bounds are
+    # shifted to k-mer indices in the discovery region so INDEX is compared in place.
+    kmer_index = df['INDEX'].values
+    index_offset = region_tig_discovery.pos
+
+    up_flank = np.greater_equal(kmer_index, region_dup_tig_up.pos - index_offset)
+    np.logical_and(up_flank, kmer_index < region_dup_tig_up.end - k_util.k_size - index_offset, out=up_flank)
+
+    dn_flank = np.greater_equal(kmer_index, region_dup_tig_dn.pos - index_offset)
+    np.logical_and(dn_flank, kmer_index < region_dup_tig_dn.end - k_util.k_size - index_offset, out=dn_flank)
+
+    flank = np.full(df.shape[0], -1, dtype=np.int8)
+
+    flank[up_flank] = 0
+    flank[dn_flank] = 1
+
+    # Annotate upstream/downstream k-mer matches (MATCH_CATEGORIES codes, -1 for NA)
+    up_flank &= ~dn_flank
 
-    df['MATCH'] = df['MATCH'].apply(lambda val: val if val != 'NA' else np.nan)
+    match = np.full(df.shape[0], -1, dtype=np.int8)
+
+    match[up_flank] = KMER_LOC_CODE[in_up[up_flank], in_dn[up_flank]]
+    match[dn_flank] = KMER_LOC_CODE[in_dn[dn_flank], in_up[dn_flank]]
 
     # Return updated DataFrame
-    del(df['KMER_CAN'])
-    del(df['TIG_INDEX'])
+    df['FLANK'] = pd.Categorical.from_codes(flank, categories=FLANK_CATEGORIES)
+    df['MATCH'] = pd.Categorical.from_codes(match, categories=MATCH_CATEGORIES)
 
     return df
 
 
+def _rle_states(state_arr):
+    """
+    Run-length encode an array of states.
+
+    :param state_arr: Array of states (e.g. the "STATE" column of a density table).
+
+    :return: A tuple of three arrays: the state of each run, the array index where each run starts, and the length of
+        each run.
+    """
+
+    state_arr = np.asarray(state_arr)
+
+    change = np.flatnonzero(np.diff(state_arr, prepend=state_arr[0] - 1, append=state_arr[-1] + 1))
+
+    rl_start = change[:-1]
+
+    return state_arr[rl_start], rl_start, np.diff(change)
+
+
 def get_srs_tree(srs_tuple_list):
 
     # Use default value for all lengths by default
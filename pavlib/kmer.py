@@ -0,0 +1,290 @@
+"""
+Array-based k-mer routines used for calling inversions.
+
+K-mers use the same 2-bit encoding as kanapy (A=0, C=1, G=2, T=3 with the first base in the most-significant bits), so
+k-mers generated here can be mixed freely with k-mers from `kanapy.util.kmer`. Routines are compiled with numba if it
+is installed, otherwise they fall back to kanapy (slower). Compiled code is cached on disk if numba finds a writable
+cache location (see `NUMBA_CACHE_DIR` in the numba documentation).
+"""
+
+import itertools
+import numpy as np
+
+import kanapy
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# Base to 2-bit code (-1 for bases that cannot be part of a k-mer, e.g. N)
+BASE_CODE = np.full(256, -1, dtype=np.int8)
+
+for _code, _base in enumerate('ACGT'):
+    BASE_CODE[ord(_base)] = _code
+    BASE_CODE[ord(_base.lower())] = _code
+
+
+def pack_seq(seq):
+    """
+    Pack a sequence into 2 bits per base (4 bases per byte, first base in the least-significant bits of each byte)
+    with a separate bit mask marking bases that can be part of a k-mer (A, C, G, and T). Invalid bases (e.g. N) are
+    packed as A (0) with a 0 bit in the mask.
+
+    :param seq: Sequence string.
+
+    :return: A tuple of the packed bases (np.uint8), the valid-base bit mask (np.uint8, 8 bases per byte, first base in
+        the least-significant bit), and the sequence length.
+    """
+
+    code_arr = BASE_CODE[np.frombuffer(seq.encode('ascii'), dtype=np.uint8)]
+    seq_len = code_arr.shape[0]
+
+    valid_arr = code_arr >= 0
+
+    # Pad to a whole number of bytes (4 bases)
+    pad_arr = np.zeros(((seq_len + 3) // 4) * 4, dtype=np.uint8)
+    np.copyto(pad_arr[:seq_len], code_arr, casting='unsafe', where=valid_arr)
+
+    packed_arr = pad_arr[0::4] | (pad_arr[1::4] << 2) | (pad_arr[2::4] << 4) | (pad_arr[3::4] << 6)
+
+    return packed_arr, np.packbits(valid_arr, bitorder='little'), seq_len
+
+
+def rev_complement_arr(kmer_arr, k_size):
+    """
+    Reverse-complement an array of k-mers.
+
+    :param kmer_arr: Array of k-mers.
+    :param k_size: K-mer size.
+
+    :return: A np.uint64 array of reverse-complemented k-mers.
+    """
+
+    kmer_arr = np.asarray(kmer_arr, dtype=np.uint64)
+    rev_arr = np.zeros_like(kmer_arr)
+
+    for _ in range(k_size):
+        rev_arr = (rev_arr << np.uint64(2)) | (np.uint64(3) - (kmer_arr & np.uint64(3)))
+        kmer_arr = kmer_arr >> np.uint64(2)
+
+    return rev_arr
+
+
+def canonical_complement_arr(kmer_arr, k_size):
+    """
+    Get the canonical k-mer (the lesser of a k-mer and its reverse complement) for each k-mer in an array. Equivalent
+    to calling `k_util.canonical_complement()` on each k-mer.
+
+    :param kmer_arr: Array of k-mers.
+    :param k_size: K-mer size.
+
+    :return: A np.uint64 array of canonical k-mers.
+    """
+
+    kmer_arr = np.asarray(kmer_arr, dtype=np.uint64)
+
+    if numba is not None:
+        return _canonical_complement_njit(kmer_arr, k_size)
+
+    return np.minimum(kmer_arr, rev_complement_arr(kmer_arr, k_size))
+
+
+def in_sorted(sorted_arr, query_arr):
+    """
+    Test membership of each query element in a sorted array using binary search.
+
+    :param sorted_arr: Sorted array (e.g. reference k-mers).
+    :param query_arr: Array of values to test.
+
+    :return: Boolean array the same length as `query_arr`.
+    """
+
+    query_arr = np.asarray(query_arr, dtype=sorted_arr.dtype)
+
+    if sorted_arr.shape[0] == 0:
+        return np.zeros(query_arr.shape[0], dtype=bool)
+
+    hit_index = np.searchsorted(sorted_arr, query_arr)
+
+    return (hit_index < sorted_arr.shape[0]) & (
+        sorted_arr[np.clip(hit_index, 0, sorted_arr.shape[0] - 1)] == query_arr
+    )
+
+
+def stream_arrays(seq, k_util):
+    """
+    Get k-mers from a sequence with their index as arrays. Equivalent to
+    `kanapy.util.kmer.stream(seq, k_util, index=True)` without building a tuple for each k-mer.
+
+    K-mers containing bases other than A, C, G, and T are skipped (indices of skipped k-mers are also skipped).
+
+    :param seq: Sequence string.
+    :param k_util: K-mer utility from kanapy package.
+
+    :return: A tuple of two arrays: k-mers (np.uint64) and k-mer index in `seq` (np.int32).
+    """
+
+    if numba is not None:
+        # No reference k-mers to test, states are discarded
+        kmer_arr, index_arr, _ = _kmer_stream_njit(
+            *pack_seq(seq),
+            k_util.k_size,
+            np.uint64((1 << (2 * k_util.k_size)) - 1),
+            np.zeros(0, dtype=np.uint64),
+            np.zeros((2, 2), dtype=np.int8)
+        )
+
+        return kmer_arr, index_arr
+
+    # Fallback without numba: Flatten (k-mer, index) tuples into one array
+    kmer_index_arr = np.fromiter(
+        itertools.chain.from_iterable(kanapy.util.kmer.stream(seq, k_util, index=True)), dtype=np.uint64
+    ).reshape(-1, 2)
+
+    return np.ascontiguousarray(kmer_index_arr[:, 0]), kmer_index_arr[:, 1].astype(np.int32)
+
+
+def stream_state(seq, k_util, ref_kmer_arr, state_matrix):
+    """
+    Get k-mers from a sequence with their index and a state determined by the presence of each k-mer in a set of
+    reference k-mers. The state is `state_matrix[in_ref(kmer), in_ref(rev_complement(kmer))]`.
+
+    K-mers containing bases other than A, C, G, and T are skipped (indices of skipped k-mers are also skipped).
+
+    :param seq: Sequence string.
+    :param k_util: K-mer utility from kanapy package.
+    :param ref_kmer_arr: Sorted numpy array (np.uint64) of reference k-mers.
+    :param state_matrix: 2x2 array of states indexed by [in forward, in reverse-complement].
+
+    :return: A tuple of three arrays: k-mers (np.uint64), k-mer index in `seq` (np.int32), and k-mer state (np.int8).
+    """
+
+    ref_kmer_arr = np.asarray(ref_kmer_arr, dtype=np.uint64)
+    state_matrix = np.asarray(state_matrix, dtype=np.int8)
+
+    if numba is not None:
+        return _kmer_stream_njit(
+            *pack_seq(seq),
+            k_util.k_size,
+            np.uint64((1 << (2 * k_util.k_size)) - 1),
+            ref_kmer_arr,
+            state_matrix
+        )
+
+    # Fallback without numba
+    kmer_arr, index_arr = stream_arrays(seq, k_util)
+
+    state_arr = state_matrix[
+        in_sorted(ref_kmer_arr, kmer_arr).astype(int),
+        in_sorted(ref_kmer_arr, rev_complement_arr(kmer_arr, k_util.k_size)).astype(int)
+    ]
+
+    return kmer_arr, index_arr, state_arr
+
+
+def _kmer_stream(packed_arr, valid_arr, seq_len, k_size, k_mask, ref_kmer_arr, state_matrix):
+    """
+    Rolling k-mer and state assignment for `stream_state()`. Compiled by numba if available.
+
+    :param packed_arr: Sequence packed 2 bits per base (`pack_seq()`).
+    :param valid_arr: Valid-base bit mask (`pack_seq()`).
+    :param seq_len: Sequence length.
+    :param k_size: K-mer size.
+    :param k_mask: Mask of the lower `2 * k_size` bits (np.uint64).
+    :param ref_kmer_arr: Sorted np.uint64 array of reference k-mers.
+    :param state_matrix: 2x2 np.int8 array of states indexed by [in forward, in reverse-complement].
+
+    :return: A tuple of k-mer (np.uint64), index (np.int32), and state (np.int8) arrays.
+    """
+
+    n_kmer_max = max(seq_len - k_size + 1, 0)
+
+    kmer_arr = np.empty(n_kmer_max, dtype=np.uint64)
+    index_arr = np.empty(n_kmer_max, dtype=np.int32)
+    state_arr = np.empty(n_kmer_max, dtype=np.int8)
+
+    n_ref = ref_kmer_arr.shape[0]
+    rev_shift = np.uint64(2 * (k_size - 1))
+
+    kmer = np.uint64(0)
+    kmer_rev = np.uint64(0)
+    load = 0
+    n_kmer = 0
+
+    for seq_index in range(seq_len):
+
+        if not (valid_arr[seq_index >> 3] >> (seq_index & 7)) & 1:
+            load = 0
+            continue
+
+        code = (packed_arr[seq_index >> 2] >> ((seq_index & 3) * 2)) & 3
+
+        kmer = ((kmer << np.uint64(2)) | np.uint64(code)) & k_mask
+        kmer_rev = (kmer_rev >> np.uint64(2)) | (np.uint64(3 - code) << rev_shift)
+
+        load += 1
+
+        if load >= k_size:
+            ref_index = np.searchsorted(ref_kmer_arr, kmer)
+            in_fwd = 1 if ref_index < n_ref and ref_kmer_arr[ref_index] == kmer else 0
+
+            ref_index = np.searchsorted(ref_kmer_arr, kmer_rev)
+            in_rev = 1 if ref_index < n_ref and ref_kmer_arr[ref_index] == kmer_rev else 0
+
+            kmer_arr[n_kmer] = kmer
+            index_arr[n_kmer] = seq_index - k_size + 1
+            state_arr[n_kmer] = state_matrix[in_fwd, in_rev]
+
+            n_kmer += 1
+
+    return kmer_arr[:n_kmer], index_arr[:n_kmer], state_arr[:n_kmer]
+
+
+def _njit_cached(func):
+    """
+    Compile a function with numba and cache the compiled code on disk. If numba cannot find a writable cache location
+    (e.g. a read-only install run by a user without a writable home directory), compile without caching.
+
+    :param func: Function to compile.
+
+    :return: Compiled function.
+    """
+
+    try:
+        return numba.njit(cache=True)(func)
+
+    except RuntimeError:
+        return numba.njit(func)
+
+
+if numba is not None:
+    _kmer_stream_njit = _njit_cached(_kmer_stream)
+
+
+    @_njit_cached
+    def _canonical_complement_njit(kmer_arr, k_size):
+        """
+        Compiled canonical k-mers for `canonical_complement_arr()`.
+
+        :param kmer_arr: Array of k-mers (np.uint64).
+        :param k_size: K-mer size.
+
+        :return: A np.uint64 array of canonical k-mers.
+        """
+
+        can_arr = np.empty_like(kmer_arr)
+
+        for arr_index in range(kmer_arr.shape[0]):
+            kmer = kmer_arr[arr_index]
+            fwd = kmer
+            rev = np.uint64(0)
+
+            for _ in range(k_size):
+                rev = (rev << np.uint64(2)) | (np.uint64(3) - (fwd & np.uint64(3)))
+                fwd = fwd >> np.uint64(2)
+
+            can_arr[arr_index] = kmer if kmer < rev else rev
+
+        return can_arr
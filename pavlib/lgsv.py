@@ -71,6 +71,9 @@ def scan_for_events(df, df_tig_fai, hap, ref_fa_name, tig_fa_name, k_size, n_tre
     align_lift = pavlib.align.AlignLift(df, df_tig_fai)
     k_util = kanapy.util.kmer.KmerUtil(k_size)
 
+    # Reference FAI for inversion scans
+    df_ref_fai = svpoplib.ref.get_df_fai(ref_fa_name + '.fai')
+
     # with RefTigManager(ref_fa_name, tig_fa_name) as fa_pair:
     #
     #     ref_fa = fa_pair[0]
@@ -345,6 +348,7 @@ def scan_for_events(df, df_tig_fai, hap, ref_fa_name, tig_fa_name, k_size, n_tre
                             n_tree=n_tree,
                             srs_tree=srs_tree,
                             log=log,
+                            df_fai=df_ref_fai,
                             min_exp_count=1  # If alignment truncation does not contain inverted k-mers at sufficient density, stop searching
                         )
 
@@ -456,6 +460,7 @@ def scan_for_events(df, df_tig_fai, hap, ref_fa_name, tig_fa_name, k_size, n_tre
                             n_tree=n_tree,
                             srs_tree=srs_tree,
                             log=log,
+                            df_fai=df_ref_fai,
                             min_exp_count=1  # If alignment truncation does not contain inverted k-mers at sufficient density, stop searching
                         )
 
@@ -313,7 +313,7 @@ def kmer_density_plot_base(df, region_tig, width=7, height=4, dpi=300, flank_whi
         for index, subdf in df.loc[
             ~ pd.isnull(df['MATCH'])
         ].groupby(
-            ['STATE', 'MATCH']
+            ['STATE', 'MATCH'], observed=True
         ):
 
             # Whisker y-values
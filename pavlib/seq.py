@@ -13,6 +13,7 @@ import pysam
 import re
 import shutil
 
+import pavlib
 import svpoplib
 import kanapy
 
@@ -115,7 +116,9 @@ class Region:
 
         :param expand_bp: Expand this number of bases. May be negative (untested).
         :param min_pos: Lower limit on the new position.
-        :param max_end: Upper limit on the new end.
+        :param max_end: Upper limit on the new end. May be an integer or a Series of chromosome lengths keyed by
+            chromosome name (e.g. a reference FAI). If a Series does not contain this region's chromosome, the end is
+            not limited.
         :param shift: If `True`, shift the expand window if one end exceeds a limit. Tries to preserve `expand_bp` while
             honoring the limits.
         :param balance: Shift `pos` by `int(expand_bp * balance)` and `end` by `int(expand_bp * (1 - balance))`. If
@@ -135,7 +138,7 @@ class Region:
 
         # Get new positions
         expand_pos = int(expand_bp * balance)
-        expand_end = np.max([0, expand_bp - expand_pos])
+        expand_end = max(0, expand_bp - expand_pos)
 
         new_pos = int(self.pos - expand_pos)
         new_end = int(self.end + expand_end)
@@ -151,8 +154,12 @@ class Region:
 
         # Shift end
         if max_end is not None:
-            if max_end.__class__ == pd.core.series.Series and self.chrom in max_end.index:
-                max_end = max_end[self.chrom]
+            if max_end.__class__ == pd.core.series.Series:
+                max_end = max_end[self.chrom] if self.chrom in max_end.index else None
+
+            elif np.issubdtype(max_end.__class__, np.integer):
+                max_end = int(max_end)
+
             else:
                 max_end = None
 
@@ -291,7 +298,7 @@ def ref_kmers(region, fa_file_name, k_util):
     Get a counter keyed by k-mers.
 
     :param region: Region to extract sequence from.
-    :param fa_file_name: FASTA file to extract sequence from.
+    :param fa_file_name: FASTA file to extract sequence from (file name or open `pysam.FastaFile`).
     :param k_util: K-mer utility for k-merizing sequence.
 
     :return: A collections.Counter object key k-mer keys and counts.
@@ -309,39 +316,73 @@ def ref_kmers(region, fa_file_name, k_util):
     return ref_mer_count
 
 
+def ref_kmer_arrays(region, fa_file_name, k_util):
+    """
+    Get reference k-mers and their counts as arrays. Same k-mers and counts as `ref_kmers()` without building a
+    counter.
+
+    :param region: Region to extract sequence from.
+    :param fa_file_name: FASTA file to extract sequence from (file name or open `pysam.FastaFile`).
+    :param k_util: K-mer utility for k-merizing sequence.
+
+    :return: A tuple of two arrays: sorted unique k-mers (np.uint64) and the count of each k-mer.
+    """
+
+    ref_seq = region_seq_fasta(region, fa_file_name, False)
+
+    return np.unique(pavlib.kmer.stream_arrays(ref_seq, k_util)[0], return_counts=True)
+
+
 def region_seq_fasta(region, fa_file_name, rev_compl=None):
     """
     Get sequence from an indexed FASTA file. FASTA must have ".fai" index.
 
     :param region: Region object to extract a region, or a string with the recrord ID to extract a whole record.
-    :param fa_file_name: FASTA file name.
+    :param fa_file_name: FASTA file name or an open `pysam.FastaFile`. An open file is not closed by this function,
+        which avoids re-opening the FASTA and its index when many regions are extracted.
     :param rev_compl: Reverse-complement sequence is `True`. If `None`, reverse-complement if `region.is_rev`.
 
     :return: String sequence.
     """
 
+    if isinstance(fa_file_name, pysam.FastaFile):
+        return _region_seq_fasta(region, fa_file_name, rev_compl)
+
     with pysam.FastaFile(fa_file_name) as fa_file:
+        return _region_seq_fasta(region, fa_file, rev_compl)
+
+
+def _region_seq_fasta(region, fa_file, rev_compl):
+    """
+    Get sequence from an open indexed FASTA file.
+
+    :param region: Region object to extract a region, or a string with the recrord ID to extract a whole record.
+    :param fa_file: Open FASTA file (`pysam.FastaFile`).
+    :param rev_compl: Reverse-complement sequence is `True`. If `None`, reverse-complement if `region.is_rev`.
+
+    :return: String sequence.
+    """
 
-        if region.__class__ == str:
-            is_region = False
-        elif region.__class__ == Region:
-            is_region = True
-        else:
-            raise RuntimeError('Unrecognized region type: {}: Expected Region (pavlib.seq) or str'.format(str(region.__class__.__name__)))
-
-        if is_region:
-            sequence = fa_file.fetch(region.chrom, region.pos, region.end)
-        else:
-            sequence = fa_file.fetch(region, None, None)
-
-        if rev_compl is None:
-            if is_region and region.is_rev:
-                return str(Bio.Seq.Seq(sequence).reverse_complement())
-        else:
-            if rev_compl:
-                return str(Bio.Seq.Seq(sequence).reverse_complement())
-
-        return sequence
+    if region.__class__ == str:
+        is_region = False
+    elif region.__class__ == Region:
+        is_region = True
+    else:
+        raise RuntimeError('Unrecognized region type: {}: Expected Region (pavlib.seq) or str'.format(str(region.__class__.__name__)))
+
+    if is_region:
+        sequence = fa_file.fetch(region.chrom, region.pos, region.end)
+    else:
+        sequence = fa_file.fetch(region, None, None)
+
+    if rev_compl is None:
+        if is_region and region.is_rev:
+            return str(Bio.Seq.Seq(sequence).reverse_complement())
+    else:
+        if rev_compl:
+            return str(Bio.Seq.Seq(sequence).reverse_complement())
+
+    return sequence
 
 
 # def copy_fa_to_gz(in_file_name, out_file_name):
@@ -161,19 +161,15 @@ def get_smoothed_density():
     global sum_state_rev
 
 
-    # Make dataframe
-    df = pd.DataFrame(tig_mer_stream, columns=['KMER', 'INDEX'])
+    # Make dataframe (k-mer states were assigned when the k-mers were streamed)
+    df = pd.DataFrame({
+        'KMER': tig_kmer_arr,
+        'INDEX': tig_index_arr,
+        'STATE_MER': tig_state_arr
+    })
 
     df['STATE'] = -1
 
-    # Assign state
-    df['STATE_MER'] = df['KMER'].apply(lambda kmer:
-       KMER_ORIENTATION_STATE[
-           int(kmer in ref_kmer_set),
-           int(k_util.rev_complement(kmer) in ref_kmer_set)
-       ]
-    )
-
     # Subset to informative sites
     df = df.loc[df['STATE_MER'] != -1]
 
@@ -335,7 +331,7 @@ def get_smoothed_density():
     df['STATE'] = df[['KERN_FWD', 'KERN_FWDREV', 'KERN_REV']].apply(
         lambda vals: np.argmax(vals.array),
         axis=1
-    )
+    ).astype(np.int8)
 
     # Column order and index
     df = df[['INDEX', 'STATE_MER', 'STATE', 'KERN_FWD', 'KERN_FWDREV', 'KERN_REV', 'KMER']]
@@ -505,18 +501,19 @@ if __name__ == '__main__':
 
 
     ### Get reference k-mer counts ###
-    ref_kmer_count = pavlib.seq.ref_kmers(region_ref, args.ref, k_util)
+    ref_kmer_arr, ref_count_arr = pavlib.seq.ref_kmer_arrays(region_ref, args.ref, k_util)
 
-    if ref_kmer_count is None or len(ref_kmer_count) == 0:
+    if ref_kmer_arr.shape[0] == 0:
         print(f'No reference k-mers for region {region_ref}', file=sys.stdout)
         sys.exit(pavlib.constants.ERR_INV_FAIL)
         #raise RuntimeError(f'No reference k-mers for region {region_ref}')
 
     # Skip low-complexity sites with repetitive k-mers
-    max_mer_count = np.max(list(ref_kmer_count.values()))
+    max_mer_index = np.argmax(ref_count_arr)
+    max_mer_count = ref_count_arr[max_mer_index]
 
     if max_mer_count > MAX_REF_KMER_COUNT:
-        max_mer = [kmer for kmer, count in ref_kmer_count.items() if count == max_mer_count][0]
+        max_mer = int(ref_kmer_arr[max_mer_index])
 
         print('K-mer count exceeds max: {} > {} ({}): {}'.format(
             max_mer_count,
@@ -533,16 +530,17 @@ if __name__ == '__main__':
         #     region_ref
         # ))
 
-    ref_kmer_set = set(ref_kmer_count)
-
+    # Reference k-mers are already sorted unless reverse-complemented
     if is_rev:
-        ref_kmer_set = {k_util.rev_complement(kmer) for kmer in ref_kmer_set}
+        ref_kmer_arr = np.sort(pavlib.kmer.rev_complement_arr(ref_kmer_arr, k_util.k_size))
 
-    ## Get contig k-mers as list ##
+    ## Get contig k-mers and states as arrays (after reference checks so failed regions never read the contig) ##
 
     seq_tig = pavlib.seq.region_seq_fasta(region_tig, args.tig)
 
-    tig_mer_stream = list(kanapy.util.kmer.stream(seq_tig, k_util, index=True))
+    tig_kmer_arr, tig_index_arr, tig_state_arr = pavlib.kmer.stream_state(
+        seq_tig, k_util, ref_kmer_arr, KMER_ORIENTATION_STATE
+    )
 
     ### Make args global variable (for convenience) ###
     threads = args.threads